@@ -1,51 +1,75 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import logging
+import math
 import uuid
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from itertools import islice
 from typing import List, Optional, Dict, Any
 import os
 import uvicorn
 
 from models import (
     UserQuery, ChatResponse, ExpansionProposal, APIResponse,
-    SearchQuery, BookData, StoryLogicDataset
+    SearchQuery, BookData, StoryElement, StoryLogicDataset
 )
 from story_logic import StoryLogicExtractor
-from vector_store import VectorStoreManager
+from vector_store import VectorStoreManager, get_vector_store
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model while the worker starts up rather than on the
+    # first request that needs it
+    await run_in_threadpool(get_vector_store)
+    yield
+
 app = FastAPI(
     title="StoryWeaver AI API",
     description="API for collaborative children's storytelling with semantic governance",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# Security middleware
+# Security middleware. Requests without an Origin header (health probes,
+# server-to-server calls) pass straight through; listing the methods and
+# headers explicitly keeps preflight handling to a set lookup.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type", "authorization"],
 )
 
 # Serve static files
 if os.path.exists("../frontend"):
     app.mount("/static", StaticFiles(directory="../frontend"), name="static")
 
-# Global instances
-story_extractor = StoryLogicExtractor()
-vector_store = VectorStoreManager()
+# Shared extractor, created on first use and reused across requests
+@lru_cache(maxsize=1)
+def get_extractor() -> StoryLogicExtractor:
+    return StoryLogicExtractor()
+
+# Bound concurrent background ingestions so a burst of uploads can't fan out unchecked
+MAX_CONCURRENT_INGESTIONS = 2
+ingestion_semaphore = asyncio.Semaphore(MAX_CONCURRENT_INGESTIONS)
+ingestion_tasks = set()
+# Pages embedded and written to the vector store per add_documents call
+INGESTION_BATCH_SIZE = 64
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     logger.error(f"Global exception: {exc}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"success": False, "message": "Internal server error", "errors": [str(exc)]}
     )
@@ -83,7 +107,7 @@ async def chat(query: UserQuery):
         return APIResponse(
             success=True,
             message="Chat response generated successfully",
-            data=chat_response.dict()
+            data=chat_response.model_dump()
         )
         
     except Exception as e:
@@ -139,7 +163,7 @@ async def propose_expansion(proposal: ExpansionProposal):
             success=True,
             message="Expansion proposal submitted successfully",
             data={
-                "proposal_id": str(uuid.uuid4()),
+                "proposal_id": uuid.uuid4(),
                 "consistency_check": consistency_check
             }
         )
@@ -149,11 +173,17 @@ async def propose_expansion(proposal: ExpansionProposal):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/ingest", response_model=APIResponse)
-async def ingest_book(book_data: BookData, background_tasks: BackgroundTasks):
+async def ingest_book(
+    book_data: BookData,
+    extractor: StoryLogicExtractor = Depends(get_extractor),
+    store: VectorStoreManager = Depends(get_vector_store)
+):
     """Ingest a book into the system"""
     try:
-        # Add background task for processing
-        background_tasks.add_task(process_book_ingestion, book_data)
+        # Process in the background; keep a reference so the task isn't garbage collected
+        task = asyncio.create_task(process_book_ingestion(book_data, extractor, store))
+        ingestion_tasks.add(task)
+        task.add_done_callback(ingestion_tasks.discard)
         
         return APIResponse(
             success=True,
@@ -211,34 +241,71 @@ async def list_stories():
         logger.error(f"Stories list error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_book_ingestion(book_data: BookData):
+def iter_document_batches(book_data: BookData, batch_size: int = INGESTION_BATCH_SIZE):
+    """Yield vector store documents for a book, batch_size pages at a time"""
+    documents = (
+        {
+            "text": page.text,
+            "metadata": {
+                "page_number": page.page_number,
+                "title": book_data.title,
+                "story_id": book_data.story_id
+            }
+        }
+        for page in book_data.pages
+    )
+    while batch := list(islice(documents, batch_size)):
+        yield batch
+
+async def index_book_pages(book_data: BookData, store: VectorStoreManager) -> int:
+    """Add a book's pages to the vector store batch by batch"""
+    count = 0
+    for batch in iter_document_batches(book_data):
+        await run_in_threadpool(store.add_documents, book_data.story_id, batch)
+        count += len(batch)
+    return count
+
+async def extract_book_elements(pages: List[Dict[str, Any]], extractor: StoryLogicExtractor) -> List[StoryElement]:
+    """Extract story elements from page chunks in parallel threads"""
+    # spaCy releases the GIL inside its C code, so one chunk per core scales
+    chunk_size = math.ceil(len(pages) / (os.cpu_count() or 1))
+    chunks = [pages[i:i + chunk_size] for i in range(0, len(pages), chunk_size)]
+    results = await asyncio.gather(
+        *(run_in_threadpool(extractor.extract_story_elements, chunk) for chunk in chunks)
+    )
+    return extractor.merge_elements(results)
+
+async def process_book_ingestion(book_data: BookData, extractor: StoryLogicExtractor, store: VectorStoreManager):
     """Background task for book ingestion"""
-    try:
-        logger.info(f"Processing ingestion for story: {book_data.story_id}")
-        
-        # Extract story elements
-        pages = [{"page_number": p.page_number, "text": p.text} for p in book_data.pages]
-        elements = story_extractor.extract_story_elements(pages)
-        
-        # Add to vector store
-        documents = []
-        for page in book_data.pages:
-            documents.append({
-                "text": page.text,
-                "metadata": {
-                    "page_number": page.page_number,
-                    "title": book_data.title,
-                    "story_id": book_data.story_id
-                }
-            })
-        
-        vector_store.add_documents(book_data.story_id, documents)
-        
-        logger.info(f"Successfully ingested {len(documents)} pages and {len(elements)} elements")
-        
-    except Exception as e:
-        logger.error(f"Background ingestion error: {e}")
-        raise
+    async with ingestion_semaphore:
+        try:
+            logger.info(f"Processing ingestion for story: {book_data.story_id}")
+            
+            # Extract story elements off the event loop while the pages are indexed
+            pages = [{"page_number": p.page_number, "text": p.text} for p in book_data.pages]
+            elements, page_count = await asyncio.gather(
+                extract_book_elements(pages, extractor),
+                index_book_pages(book_data, store)
+            )
+            
+            logger.info(f"Successfully ingested {page_count} pages and {len(elements)} elements")
+            
+        except Exception as e:
+            # Nothing awaits this task, so logging is the only place the error surfaces
+            logger.error(f"Background ingestion error: {e}")
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # A single worker: the embedded Chroma PersistentClient is not safe to open
+    # from several processes on the same directory, and each worker would also
+    # run its own ingestions and encoder. Scaling out needs Chroma in
+    # client/server mode; then set WEB_CONCURRENCY to the worker count so each
+    # encoder takes its share of the cores, e.g.
+    #   WEB_CONCURRENCY=4 gunicorn app:app -k uvicorn.workers.UvicornWorker -w 4
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=1
+    )
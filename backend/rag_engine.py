@@ -1,55 +1,46 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_community.llms import HuggingFacePipeline
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-import torch
-from vector_store import VectorStoreManager
+from vector_store import cpu_supports_bf16, get_vector_store
 from story_logic import StoryLogicExtractor
-from models import StoryLogicDataset, ChatResponse, ExpansionProposal
+from models import StoryLogicDataset, StoryElementType, ChatResponse, ExpansionProposal
 
-class RAGChatbot:
-    def __init__(self, model_name="microsoft/DialoGPT-medium"):
-        self.vector_store = VectorStoreManager()
-        self.logic_extractor = StoryLogicExtractor()
-        self.story_datasets = {}  # story_id -> StoryLogicDataset
-        
-        # Load local LLM
-        self.llm = self._load_local_llm(model_name)
-        
-        # Define prompts
-        self.qa_prompt = PromptTemplate(
-            input_variables=["context", "question", "story_logic"],
-            template="""
+# Section header for each element type in the formatted story logic
+_TYPE_HEADERS = {t: f"\n{t.value.upper()}S:\n" for t in StoryElementType}
+
+# Static prompts are filled with %-formatting; nothing needs re-parsing per call
+QA_TEMPLATE = """
             You are a helpful assistant for a children's illustration book website.
             You have access to the following story context and logic rules.
             
             STORY CONTEXT:
-            {context}
+            %(context)s
             
             STORY LOGIC RULES:
-            {story_logic}
+            %(story_logic)s
             
-            USER QUESTION: {question}
+            USER QUESTION: %(question)s
             
             Answer the question based on the story context while respecting the story logic rules.
             If you cannot answer from the context, say so politely.
             Keep responses friendly, engaging, and appropriate for children.
             """
-        )
-        
-        self.validation_prompt = PromptTemplate(
-            input_variables=["proposal", "story_logic", "existing_context"],
-            template="""
+
+# Positional holes: proposal, story_logic, existing_context
+VALIDATION_TEMPLATE = """
             Validate if this story expansion proposal is permissible:
             
-            PROPOSAL: {proposal}
+            PROPOSAL: %s
             
             EXISTING STORY LOGIC:
-            {story_logic}
+            %s
             
             EXISTING CONTEXT:
-            {existing_context}
+            %s
             
             Check for:
             1. Consistency with established characters
@@ -58,35 +49,133 @@ class RAGChatbot:
             4. Thematic alignment
             
             Return validation result as JSON:
-            {{
+            {
                 "is_permissible": true/false,
                 "reasoning": "explanation",
                 "suggestions": ["suggestion1", "suggestion2"]
-            }}
+            }
             """
-        )
+
+def render_qa(context: str, question: str, story_logic: str) -> str:
+    return QA_TEMPLATE % {"context": context, "question": question, "story_logic": story_logic}
+
+def render_validation(proposal: str, story_logic: str, existing_context: str) -> str:
+    return VALIDATION_TEMPLATE % (proposal, story_logic, existing_context)
+
+class BatchedGenerator:
+    """Coalesces concurrent prompts into micro-batched model.generate calls"""
+    
+    def __init__(self, model, tokenizer, max_batch: int = 8, max_wait: float = 0.01, **generate_kwargs):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.generate_kwargs = generate_kwargs
+        
+        # Decoder-only models must be left-padded so every prompt ends where generation starts
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+        
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self._worker.start()
+    
+    def __call__(self, prompt: str) -> str:
+        """Generate a completion, blocking until the batch containing it finishes"""
+        future = Future()
+        self._queue.put((prompt, future))
+        return future.result()
+    
+    def _next_batch(self) -> List[tuple]:
+        """Wait for one prompt, then gather more for up to max_wait seconds"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                completions = self._generate([prompt for prompt, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            for (_, future), completion in zip(batch, completions):
+                future.set_result(completion)
+    
+    def _generate(self, prompts: List[str]) -> List[str]:
+        import torch
+        
+        inputs = self.tokenizer(prompts, padding=True, return_tensors="pt").to(self.model.device)
+        with torch.inference_mode():
+            output = self.model.generate(
+                **inputs,
+                pad_token_id=self.tokenizer.pad_token_id,
+                use_cache=True,
+                **self.generate_kwargs
+            )
+        
+        # Strip the (left-padded) prompts so only the new tokens are returned
+        return self.tokenizer.batch_decode(output[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+class RAGChatbot:
+    def __init__(self, model_name="microsoft/DialoGPT-medium"):
+        self.vector_store = get_vector_store()
+        self.logic_extractor = StoryLogicExtractor()
+        self.story_datasets = {}  # story_id -> StoryLogicDataset
+        # Formatted logic is a pure function of (story_id, version); update_dataset bumps the version
+        self._format_story_logic_cached = lru_cache(maxsize=256)(self._build_story_logic)
         
-        self.qa_chain = LLMChain(llm=self.llm, prompt=self.qa_prompt)
+        # Load local LLM
+        self.llm = self._load_local_llm(model_name)
     
     def _load_local_llm(self, model_name: str):
         """Load a local Hugging Face model"""
+        # Imported here so processes that never chat don't pay for torch/transformers
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+        
         tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            low_cpu_mem_usage=True
-        )
         
-        pipe = pipeline(
-            "text-generation",
-            model=model,
-            tokenizer=tokenizer,
+        if torch.cuda.is_available():
+            # 4-bit NF4 weights cut the bytes read per decoded token ~4x versus fp16
+            model = AutoModelForCausalLM.from_pretrained(
+                model_name,
+                quantization_config=BitsAndBytesConfig(
+                    load_in_4bit=True,
+                    bnb_4bit_compute_dtype=torch.float16,
+                    bnb_4bit_quant_type="nf4"
+                ),
+                device_map="auto",
+                low_cpu_mem_usage=True
+            )
+        else:
+            model = AutoModelForCausalLM.from_pretrained(
+                model_name,
+                torch_dtype=torch.bfloat16 if cpu_supports_bf16() else torch.float32,
+                low_cpu_mem_usage=True
+            )
+            # Compile forward rather than the module so generate() picks up the compiled graph
+            model.forward = torch.compile(model.forward, mode="reduce-overhead")
+        
+        return BatchedGenerator(
+            model,
+            tokenizer,
             max_new_tokens=256,
             temperature=0.7,
             do_sample=True
         )
-        
-        return HuggingFacePipeline(pipeline=pipe)
     
     def query_story(self, story_id: str, question: str) -> ChatResponse:
         """Query a specific story with RAG"""
@@ -100,11 +189,7 @@ class RAGChatbot:
         story_logic = self._format_story_logic(story_id)
         
         # Generate response
-        response = self.qa_chain.run(
-            context=context,
-            question=question,
-            story_logic=story_logic
-        )
+        response = self.llm(render_qa(context, question, story_logic))
         
         return ChatResponse(
             response=response,
@@ -133,11 +218,7 @@ class RAGChatbot:
         story_logic_str = self._format_story_logic(story_id)
         
         # Validate with LLM
-        validation_input = self.validation_prompt.format(
-            proposal=proposal.new_content,
-            story_logic=story_logic_str,
-            existing_context=existing_context
-        )
+        validation_input = render_validation(proposal.new_content, story_logic_str, existing_context)
         
         validation_result = self.llm(validation_input)
         
@@ -156,25 +237,27 @@ class RAGChatbot:
         if story_id not in self.story_datasets:
             return "No story logic available."
         
+        return self._format_story_logic_cached(story_id, self.story_datasets[story_id].version)
+    
+    def _build_story_logic(self, story_id: str, version: int) -> str:
+        """Build the story logic string for a dataset version"""
         dataset = self.story_datasets[story_id]
-        logic_str = f"Title: {dataset.title}\n\n"
+        parts = [f"Title: {dataset.title}\n\n"]
         
         # Group elements by type
-        by_type = {}
+        by_type = defaultdict(list)
         for element in dataset.elements:
-            by_type.setdefault(element.element_type.value, []).append(element)
+            by_type[element.element_type].append(element)
         
         for element_type, elements in by_type.items():
-            logic_str += f"\n{element_type.upper()}S:\n"
-            for element in elements:
-                logic_str += f"- {element.name}: {element.description}\n"
+            parts.append(_TYPE_HEADERS[element_type])
+            parts.extend(f"- {element.name}: {element.description}\n" for element in elements)
         
         if dataset.rules:
-            logic_str += "\nRULES:\n"
-            for rule in dataset.rules:
-                logic_str += f"- {rule.get('description', '')}\n"
+            parts.append("\nRULES:\n")
+            parts.extend(f"- {rule.get('description', '')}\n" for rule in dataset.rules)
         
-        return logic_str
+        return "".join(parts)
     
     def update_dataset(self, story_id: str, new_content: Dict):
         """Update story dataset with new content"""
@@ -210,4 +293,4 @@ class RAGChatbot:
                 "type": "expansion",
                 "timestamp": datetime.now().isoformat()
             }
-        }])
\ No newline at end of file
+        }])
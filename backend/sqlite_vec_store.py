@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+try:
+    from vector_store import load_embedding_model
+except ImportError:  # imported as backend.sqlite_vec_store, e.g. from scripts/ingest.py
+    from .vector_store import load_embedding_model
+
+try:
+    import sqlite_vec
+except ImportError:  # sqlite-vec is optional; VectorStoreManager (Chroma) is the default backend
+    sqlite_vec = None
+
+logger = logging.getLogger(__name__)
+
+def quantize_int8(embeddings: np.ndarray) -> np.ndarray:
+    """Symmetric per-vector int8 quantization.
+    
+    Each vector is scaled so its largest component maps to +/-127. Cosine
+    distance ignores a vector's length, so the scale isn't kept.
+    """
+    scale = np.max(np.abs(embeddings), axis=-1, keepdims=True) / 127.0
+    return np.round(embeddings / np.maximum(scale, 1e-12)).astype(np.int8)
+
+class SqliteVecStore:
+    """Vector store keeping every story's chunks in one sqlite-vec table.
+    
+    Chunks live in a regular table and their embeddings in a vec0 virtual
+    table partitioned by story_id, so searching one story or all of them is a
+    single KNN query instead of one Chroma collection query per story.
+    """
+    
+    def __init__(
+        self,
+        db_path: str = "./story_vectors.db",
+        dimension: int = 384,
+        batch_size: int = 64,
+        embedding_model=None,
+        quantization: str = "float32"
+    ):
+        if sqlite_vec is None:
+            raise RuntimeError("sqlite-vec is not installed; use VectorStoreManager instead")
+        if quantization not in ("float32", "int8"):
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        
+        self.db_path = db_path
+        self.dimension = dimension
+        self.batch_size = batch_size
+        # int8 stores a quarter of the bytes per vector; like the dimension, it is
+        # fixed when the database is created
+        self.quantization = quantization
+        self.embedding_model = embedding_model or load_embedding_model()
+        # One connection shared across threads; sqlite serializes writes anyway
+        self._lock = threading.Lock()
+        self.conn = self._connect()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database, load sqlite-vec and create the schema"""
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.enable_load_extension(True)
+            sqlite_vec.load(conn)
+            conn.enable_load_extension(False)
+            
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    story_id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS chunks_story_id ON chunks(story_id);
+                CREATE VIRTUAL TABLE IF NOT EXISTS vec_chunks USING vec0(
+                    story_id TEXT PARTITION KEY,
+                    embedding {"INT8" if self.quantization == "int8" else "FLOAT"}[{self.dimension}] distance_metric=cosine
+                );
+            """)
+            logger.info(f"sqlite-vec store opened at {self.db_path}")
+            return conn
+        
+        except Exception as e:
+            logger.error(f"Error initializing sqlite-vec store: {e}")
+            raise
+    
+    def _generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        return self.embedding_model.encode(texts, batch_size=self.batch_size)
+    
+    def _to_stored(self, embeddings: np.ndarray) -> np.ndarray:
+        """Contiguous vectors in the column's element type"""
+        if self.quantization == "int8":
+            return quantize_int8(embeddings)
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    
+    @property
+    def _vector_param(self) -> str:
+        # sqlite-vec reads a bare BLOB as float32; int8 vectors have to be tagged
+        return "vec_int8(?)" if self.quantization == "int8" else "?"
+    
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Embed documents; rows come back in the order of texts, ready for add_documents_batched"""
+        return self._generate_embeddings(texts)
+    
+    def add_documents(self, story_id: str, documents: List[Dict[str, Any]]):
+        """Add documents to the vector store"""
+        self.add_documents_batched(
+            story_id,
+            [doc["text"] for doc in documents],
+            [doc.get("metadata", {}) for doc in documents]
+        )
+    
+    def add_documents_batched(
+        self,
+        story_id: str,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        embeddings: Optional[np.ndarray] = None
+    ):
+        """Add parallel lists of texts and metadatas, writing batch_size documents per transaction.
+        
+        Pass embeddings (one row per text) to skip embedding, e.g. when they
+        came from embed_documents.
+        """
+        if not texts:
+            logger.warning("No documents to add")
+            return
+        
+        try:
+            # sqlite3 binds buffer-protocol objects as BLOBs, so each contiguous
+            # row is handed to sqlite-vec without a bytes copy
+            if embeddings is None:
+                embeddings = self._generate_embeddings(texts)
+            embeddings = self._to_stored(embeddings)
+            batch_size = batch_size or self.batch_size
+            
+            for start in range(0, len(texts), batch_size):
+                end = start + batch_size
+                with self._lock, self.conn:
+                    for text, metadata, embedding in zip(texts[start:end], metadatas[start:end], embeddings[start:end]):
+                        cursor = self.conn.execute(
+                            "INSERT INTO chunks (story_id, text, metadata) VALUES (?, ?, ?)",
+                            (story_id, text, json.dumps(metadata))
+                        )
+                        self.conn.execute(
+                            f"INSERT INTO vec_chunks (rowid, story_id, embedding) VALUES (?, ?, {self._vector_param})",
+                            (cursor.lastrowid, story_id, embedding)
+                        )
+            
+            logger.info(f"Added {len(texts)} documents to story '{story_id}'")
+        
+        except Exception as e:
+            logger.error(f"Error adding documents to story '{story_id}': {e}")
+            raise
+    
+    def _knn(self, query_embedding: np.ndarray, k: int, story_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Nearest chunks to the query, optionally restricted to one story's partition"""
+        partition = "AND story_id = ?" if story_id is not None else ""
+        params = [self._to_stored(np.asarray(query_embedding, dtype=np.float32)), k]
+        if story_id is not None:
+            params.append(story_id)
+        
+        with self._lock:
+            rows = self.conn.execute(f"""
+                WITH knn AS (
+                    SELECT rowid, distance FROM vec_chunks
+                    WHERE embedding MATCH {self._vector_param} AND k = ? {partition}
+                )
+                SELECT c.id, c.story_id, c.text, c.metadata, knn.distance
+                FROM knn JOIN chunks c ON c.id = knn.rowid
+                ORDER BY knn.distance
+            """, params).fetchall()
+        
+        return [
+            {
+                "id": str(row_id),
+                "story_id": row_story_id,
+                "text": text,
+                "metadata": json.loads(metadata),
+                "distance": distance
+            }
+            for row_id, row_story_id, text, metadata, distance in rows
+        ]
+    
+    def retrieve_relevant(self, story_id: str, query: str, k: int = 5, query_embedding: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Retrieve relevant documents for a query"""
+        try:
+            if query_embedding is None:
+                query_embedding = self._generate_embeddings([query])[0]
+            
+            results = self._knn(query_embedding, k, story_id)
+            logger.info(f"Found {len(results)} results for query in '{story_id}'")
+            
+            return {
+                "query": query,
+                "results": results,
+                "story_id": story_id
+            }
+        
+        except Exception as e:
+            logger.error(f"Error searching in story '{story_id}': {e}")
+            raise
+    
+    def search_all_stories(self, query: str, n_results: int = 10) -> Dict[str, Any]:
+        """Search across all stories with a single KNN query"""
+        try:
+            results = self._knn(self._generate_embeddings([query])[0], n_results)
+            
+            with self._lock:
+                total = self.conn.execute("SELECT COUNT(DISTINCT story_id) FROM chunks").fetchone()[0]
+            
+            logger.info(f"Found {len(results)} total results across all stories")
+            
+            return {
+                "query": query,
+                "results": results,
+                "total_collections": total
+            }
+        
+        except Exception as e:
+            logger.error(f"Error searching across all stories: {e}")
+            raise
+    
+    def list_stories(self) -> List[Dict[str, Any]]:
+        """List all stories with their document counts"""
+        try:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT story_id, COUNT(*) FROM chunks GROUP BY story_id ORDER BY story_id"
+                ).fetchall()
+            
+            return [{"story_id": story_id, "document_count": count, "metadata": {}} for story_id, count in rows]
+        
+        except Exception as e:
+            logger.error(f"Error listing stories: {e}")
+            raise
+    
+    def delete_story(self, story_id: str) -> bool:
+        """Delete every chunk of a story"""
+        try:
+            with self._lock, self.conn:
+                self.conn.execute(
+                    "DELETE FROM vec_chunks WHERE rowid IN (SELECT id FROM chunks WHERE story_id = ?)",
+                    (story_id,)
+                )
+                self.conn.execute("DELETE FROM chunks WHERE story_id = ?", (story_id,))
+            
+            logger.info(f"Deleted story '{story_id}'")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error deleting story '{story_id}': {e}")
+            return False
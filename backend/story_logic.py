@@ -1,20 +1,104 @@
-import spacy
 import logging
 import subprocess
 import sys
+from functools import lru_cache
 from typing import List, Dict, Any
 import json
+import numpy as np
 from models import StoryElement, StoryElementType, StoryLogicDataset
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# spaCy entity label -> (element id prefix, element type, description template)
+ENTITY_ELEMENT_TYPES = {
+    "PERSON": ("char", StoryElementType.CHARACTER, "Character appearing on page {}"),
+    "GPE": ("loc", StoryElementType.LOCATION, "Location mentioned on page {}"),
+    "LOC": ("loc", StoryElementType.LOCATION, "Location mentioned on page {}"),
+    "FAC": ("loc", StoryElementType.LOCATION, "Location mentioned on page {}"),
+}
+
+_ID_TABLE = str.maketrans(" ", "_")
+
+def _value_hash(value: Any) -> int:
+    try:
+        return hash(value)
+    except TypeError:  # e.g. list-valued attributes
+        return hash(repr(value))
+
+def _find_contradictions_loop(name_hash, species_hash, names, species, is_character):
+    """Indices of characters sharing the name hash but not the species hash"""
+    hits = np.empty(names.shape[0], dtype=np.int64)
+    count = 0
+    for i in range(names.shape[0]):
+        if is_character[i] and names[i] == name_hash and species[i] != species_hash:
+            hits[count] = i
+            count += 1
+    return hits[:count]
+
+def _find_contradictions_numpy(name_hash, species_hash, names, species, is_character):
+    """Indices of characters sharing the name hash but not the species hash"""
+    return np.flatnonzero(is_character & (names == name_hash) & (species != species_hash))
+
+@lru_cache(maxsize=1)
+def _contradiction_kernel():
+    """The numba-compiled loop, or the numpy expression without numba.
+    
+    numba is imported on the first consistency check rather than with this
+    module, so processes that never check a character don't pay for it.
+    """
+    try:
+        from numba import njit
+    except ImportError:  # numba is optional
+        return _find_contradictions_numpy
+    return njit(cache=True)(_find_contradictions_loop)
+
+class _ElementTable:
+    """Struct-of-arrays copy of the fields check_consistency compares"""
+    
+    def __init__(self, dataset: StoryLogicDataset, capacity: int = 64):
+        # The dataset object and version the table was built from; see _get_element_table
+        self.dataset = dataset
+        self.version = dataset.version
+        self.size = 0
+        self.character_positions = {}  # lowercased character name -> positions, ascending
+        self.name_hashes = np.empty(capacity, dtype=np.int64)
+        self.species_hashes = np.empty(capacity, dtype=np.int64)
+        self.is_character = np.empty(capacity, dtype=np.bool_)
+    
+    def extend(self, elements: List[StoryElement]):
+        end = self.size + len(elements)
+        if end > len(self.name_hashes):
+            capacity = max(end, 2 * len(self.name_hashes))
+            for name in ("name_hashes", "species_hashes", "is_character"):
+                column = getattr(self, name)
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+        
+        for i, element in enumerate(elements, self.size):
+            self.name_hashes[i] = _value_hash(element.name.lower())
+            self.species_hashes[i] = _value_hash(element.attributes.get("species"))
+            self.is_character[i] = element.element_type == StoryElementType.CHARACTER
+            if self.is_character[i]:
+                self.character_positions.setdefault(element.name.lower(), []).append(i)
+        self.size = end
+    
+    def columns(self):
+        return self.name_hashes[:self.size], self.species_hashes[:self.size], self.is_character[:self.size]
+
 class StoryLogicExtractor:
+    # Pipeline components extract_story_elements never reads
+    NER_DISABLED_PIPES = ["parser", "tagger", "lemmatizer", "attribute_ruler", "senter"]
+    
     def __init__(self):
         self.nlp = self._load_spacy_model()
+        self._element_tables = {}  # story_id -> _ElementTable of the last dataset checked for it
     
     def _load_spacy_model(self):
         """Load spaCy model with proper error handling"""
+        import spacy
+        
         try:
             return spacy.load("en_core_web_sm")
         except OSError:
@@ -30,6 +114,24 @@ class StoryLogicExtractor:
                 logger.error(f"Unexpected error loading spaCy model: {e}")
                 raise RuntimeError(f"Unexpected error loading spaCy model: {e}")
     
+    def _get_element_table(self, dataset: StoryLogicDataset) -> _ElementTable:
+        """Return the element table for a dataset, adding any elements appended since the last call.
+        
+        The table is rebuilt for a different dataset object or a new version,
+        so callers that edit elements in place must bump dataset.version.
+        """
+        table = self._element_tables.get(dataset.story_id)
+        if (
+            table is None
+            or table.dataset is not dataset
+            or table.version != dataset.version
+            or table.size > len(dataset.elements)
+        ):
+            table = self._element_tables[dataset.story_id] = _ElementTable(dataset)
+        if table.size < len(dataset.elements):
+            table.extend(dataset.elements[table.size:])
+        return table
+    
     def extract_5w1h(self, text: str) -> Dict[str, List[str]]:
         """Extract Who, What, When, Where, Why, How"""
         doc = self.nlp(text)
@@ -56,67 +158,88 @@ class StoryLogicExtractor:
         
         return result
     
-    def extract_story_elements(self, pages: List[Dict]) -> List[StoryElement]:
+    def extract_story_elements(self, pages: List[Dict], batch_size: int = 64) -> List[StoryElement]:
         """Extract story elements from pages"""
         elements = []
-        element_counter = {}
+        seen = set()
+        seen_mentions = set()
         
-        for page in pages:
+        # Only the entity recognizer is needed here, so batch the pages through
+        # nlp.pipe with the tagging and parsing components switched off
+        texts = [page.get("text", "") for page in pages]
+        docs = self.nlp.pipe(texts, batch_size=batch_size, disable=self.NER_DISABLED_PIPES)
+        
+        for page, doc in zip(pages, docs):
             page_num = page.get("page_number", 0)
-            text = page.get("text", "")
-            doc = self.nlp(text)
             
-            # Extract characters (proper nouns)
             for ent in doc.ents:
-                if ent.label_ == "PERSON":
-                    char_id = f"char_{ent.text.lower().replace(' ', '_')}"
-                    if char_id not in element_counter:
-                        element = StoryElement(
-                            element_id=char_id,
-                            element_type=StoryElementType.CHARACTER,
-                            name=ent.text,
-                            description=f"Character appearing on page {page_num}",
-                            attributes={"first_appearance": page_num},
-                            relationships=[],
-                            source_page=page_num
-                        )
-                        elements.append(element)
-                        element_counter[char_id] = element
-            
-            # Extract locations
-            for ent in doc.ents:
-                if ent.label_ in ["GPE", "LOC", "FAC"]:
-                    loc_id = f"loc_{ent.text.lower().replace(' ', '_')}"
-                    if loc_id not in element_counter:
-                        element = StoryElement(
-                            element_id=loc_id,
-                            element_type=StoryElementType.LOCATION,
-                            name=ent.text,
-                            description=f"Location mentioned on page {page_num}",
-                            attributes={},
-                            relationships=[],
-                            source_page=page_num
-                        )
-                        elements.append(element)
-                        element_counter[loc_id] = element
+                entity_type = ENTITY_ELEMENT_TYPES.get(ent.label_)
+                if entity_type is None:
+                    continue
+                
+                # Repeated mentions of the same entity are one set lookup
+                prefix, element_type, description = entity_type
+                mention = (prefix, ent.text)
+                if mention in seen_mentions:
+                    continue
+                seen_mentions.add(mention)
+                
+                element_id = f"{prefix}_{ent.text.lower().translate(_ID_TABLE)}"
+                if element_id in seen:
+                    continue
+                
+                seen.add(element_id)
+                elements.append(StoryElement(
+                    element_id=element_id,
+                    element_type=element_type,
+                    name=ent.text,
+                    description=description.format(page_num),
+                    attributes={"first_appearance": page_num} if element_type == StoryElementType.CHARACTER else {},
+                    relationships=[],
+                    source_page=page_num
+                ))
         
         return elements
     
+    @staticmethod
+    def merge_elements(chunks: List[List[StoryElement]]) -> List[StoryElement]:
+        """Merge per-chunk extraction results in page order, keeping each element's first occurrence"""
+        elements = []
+        seen = set()
+        for chunk in chunks:
+            for element in chunk:
+                if element.element_id not in seen:
+                    seen.add(element.element_id)
+                    elements.append(element)
+        return elements
+    
     def check_consistency(self, new_element: StoryElement, dataset: StoryLogicDataset) -> Dict[str, Any]:
         """Check if new element is consistent with existing story logic"""
         contradictions = []
         suggestions = []
         
-        for existing in dataset.elements:
-            # Check for character consistency
-            if existing.element_type == StoryElementType.CHARACTER and new_element.element_type == StoryElementType.CHARACTER:
+        if new_element.element_type == StoryElementType.CHARACTER:
+            table = self._get_element_table(dataset)
+            
+            # Only characters with exactly this name can contradict it, so an
+            # exact name lookup picks the candidates instead of a full scan
+            positions = np.asarray(table.character_positions.get(new_element.name.lower(), ()), dtype=np.int64)
+            names, species, is_character = (column[positions] for column in table.columns())
+            
+            hits = _contradiction_kernel()(
+                _value_hash(new_element.name.lower()),
+                _value_hash(new_element.attributes.get("species")),
+                names, species, is_character
+            )
+            hits = positions[hits]
+            
+            for position in hits:
+                existing = dataset.elements[position]
+                # Hashes can collide, so confirm on the elements themselves
                 if existing.name.lower() == new_element.name.lower() and existing.attributes.get("species") != new_element.attributes.get("species"):
                     contradictions.append(f"Character {existing.name} has inconsistent attributes")
-            
-            # Check location rules
-            if existing.element_type == StoryElementType.RULE and "location" in existing.description.lower():
-                # Implement rule checking logic here
-                pass
+        
+        # Location rules (RULE elements mentioning locations) are not enforced yet
         
         return {
             "is_consistent": len(contradictions) == 0,
@@ -1,29 +1,276 @@
 import chromadb
+import heapq
 import logging
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import repeat
 from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
-import uuid
+import numpy as np
 import os
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Store returned by get_vector_store() to the API and scripts/ingest.py:
+# "chroma" (VectorStoreManager) or "sqlite-vec" (SqliteVecStore at SQLITE_VEC_PATH)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+SQLITE_VEC_PATH = os.getenv("SQLITE_VEC_PATH", "./story_vectors.db")
+# "int8" stores a quarter of the bytes per vector; sqlite-vec only, fixed when its database is created
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "float32")
+# Worker processes the Chroma store encodes in; 0 encodes in this process
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", "0"))
+
+def default_num_threads() -> int:
+    """Encoder threads per process: the cores divided by WEB_CONCURRENCY server workers"""
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", "1"))))
+
+class OnnxEncoder:
+    """Int8-quantized ONNX Runtime export of a sentence-transformer (mean pooling + L2 norm)"""
+    
+    MAX_SEQ_LENGTH = 256
+    
+    def __init__(self, model_name: str, cache_dir: str, num_threads: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        model_path = self._export(model_name, cache_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(cache_dir)
+        
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads or default_num_threads()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+    
+    @staticmethod
+    def _export(model_name: str, cache_dir: str) -> str:
+        """Export and quantize the model once, reusing the files on later starts.
+        
+        Several processes may start at once, so each exports into its own
+        temporary directory and moves the files into place atomically. The
+        quantized model is moved last: once it exists, the rest is complete.
+        """
+        quantized_path = os.path.join(cache_dir, "model_quantized.onnx")
+        if not os.path.exists(quantized_path):
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            from transformers import AutoTokenizer
+            
+            logger.info(f"Exporting '{model_name}' to ONNX in {cache_dir}")
+            os.makedirs(cache_dir, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=cache_dir) as export_dir:
+                ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+                AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+                quantize_dynamic(
+                    os.path.join(export_dir, "model.onnx"),
+                    os.path.join(export_dir, "model_quantized.onnx"),
+                    weight_type=QuantType.QInt8
+                )
+                names = sorted(os.listdir(export_dir), key=lambda name: name == "model_quantized.onnx")
+                for name in names:
+                    os.replace(os.path.join(export_dir, name), os.path.join(cache_dir, name))
+        return quantized_path
+    
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Encode texts to L2-normalized sentence embeddings"""
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.MAX_SEQ_LENGTH,
+                return_tensors="np"
+            )
+            token_embeddings = self.session.run(
+                None, {name: inputs[name].astype(np.int64) for name in self.input_names}
+            )[0]
+            
+            # Mean-pool over real tokens only, then normalize like the sentence-transformers model
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            batches.append(pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12))
+        
+        return np.concatenate(batches).astype(np.float32, copy=False)
+
+def cpu_supports_bf16() -> bool:
+    """Whether the CPU has native bfloat16 arithmetic; without it bf16 is emulated and slower than fp32"""
+    import torch
+    try:
+        return torch.cpu._is_avx512_bf16_supported()
+    except AttributeError:
+        return False
+
+class SentenceTransformerEncoder:
+    """PyTorch sentence-transformer configured for CPU inference"""
+    
+    def __init__(self, model_name: str, num_threads: Optional[int] = None):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        
+        torch.set_num_threads(num_threads or default_num_threads())
+        try:
+            torch.set_num_interop_threads(2)
+        except RuntimeError:  # only settable before the first inter-op parallel work
+            pass
+        
+        self.model = SentenceTransformer(model_name)
+        if not torch.cuda.is_available() and cpu_supports_bf16():
+            self.model = self.model.to(torch.bfloat16)
+    
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Encode texts to L2-normalized sentence embeddings"""
+        embeddings = self.model.encode(texts, batch_size=batch_size, convert_to_tensor=True, show_progress_bar=False)
+        # numpy has no bfloat16, and Chroma stores float32 anyway
+        return embeddings.float().cpu().numpy()
+
+def load_embedding_model(backend: str = "onnx", onnx_cache_dir: str = "./onnx_models", num_threads: Optional[int] = None):
+    """Load the embedding model, preferring the quantized ONNX encoder"""
+    if backend == "onnx":
+        try:
+            return OnnxEncoder(EMBEDDING_MODEL_NAME, os.path.join(onnx_cache_dir, "all-MiniLM-L6-v2"), num_threads)
+        except Exception as e:
+            logger.warning(f"ONNX encoder unavailable, falling back to sentence-transformers: {e}")
+    
+    return SentenceTransformerEncoder(EMBEDDING_MODEL_NAME, num_threads)
+
+# Per-process model for VectorStoreManager's encode pool, loaded by the pool initializer
+_worker_model = None
+
+def _load_worker_model(backend: str, onnx_cache_dir: str, num_threads: int):
+    global _worker_model
+    _worker_model = load_embedding_model(backend, onnx_cache_dir, num_threads)
+
+def _encode_in_worker(texts: List[str], batch_size: int) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=batch_size)
+
+class SemanticResultCache:
+    """Query results for one story, looked up by embedding similarity with LRU eviction.
+    
+    Embeddings are L2-normalized, so a dot product against the cached
+    (capacity, dim) matrix gives cosine similarity for every entry at once.
+    Entries expire after ttl seconds, since writes from other processes
+    (e.g. scripts/ingest.py) can't invalidate this process's cache.
+    """
+    
+    def __init__(self, capacity: int = 256, threshold: float = 0.97, ttl: float = 60.0):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.embeddings = None  # allocated on first insert, once the dimension is known
+        self.entries = []  # row -> (k, results)
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.inserted_at = np.zeros(capacity, dtype=np.float64)
+        self._clock = 0
+        self._lock = threading.Lock()
+    
+    def lookup(self, query_embedding: np.ndarray, k: int) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            if not self.entries:
+                return None
+            
+            scores = self.embeddings[:len(self.entries)] @ query_embedding
+            row = int(np.argmax(scores))
+            cached_k, results = self.entries[row]
+            if scores[row] < self.threshold or cached_k < k:
+                return None
+            if time.monotonic() - self.inserted_at[row] > self.ttl:
+                return None
+            
+            self._clock += 1
+            self.last_used[row] = self._clock
+        return [dict(result) for result in results[:k]]
+    
+    def insert(self, query_embedding: np.ndarray, k: int, results: List[Dict[str, Any]]):
+        with self._lock:
+            if self.embeddings is None:
+                self.embeddings = np.empty((self.capacity, query_embedding.shape[0]), dtype=np.float32)
+            
+            if len(self.entries) < self.capacity:
+                row = len(self.entries)
+                self.entries.append(None)
+            else:
+                row = int(np.argmin(self.last_used))
+            
+            self.embeddings[row] = query_embedding
+            self.entries[row] = (k, [dict(result) for result in results])
+            self.inserted_at[row] = time.monotonic()
+            self._clock += 1
+            self.last_used[row] = self._clock
+
 class VectorStoreManager:
     """Manages vector storage using ChromaDB and sentence transformers"""
     
-    def __init__(self, persist_directory: str = "./chroma_db"):
+    # Exact-match LRU of query embeddings; longer texts are documents, not queries
+    QUERY_CACHE_SIZE = 1024
+    QUERY_CACHE_MAX_CHARS = 512
+    # Documents embedded and written per collection.add call
+    ADD_BATCH_SIZE = 256
+    
+    def __init__(
+        self,
+        persist_directory: str = "./chroma_db",
+        batch_size: int = 64,
+        embedding_backend: str = "onnx",
+        onnx_cache_dir: str = "./onnx_models",
+        encode_workers: int = 0,
+        hnsw_m: int = 16,
+        hnsw_construction_ef: int = 200,
+        hnsw_search_ef: int = 64,
+        hnsw_batch_size: int = 100,
+        hnsw_sync_threshold: int = 1000
+    ):
         self.persist_directory = persist_directory
+        self.batch_size = batch_size
+        self.embedding_backend = embedding_backend
+        self.onnx_cache_dir = onnx_cache_dir
+        # With encode_workers > 0, embeddings are computed in that many worker
+        # processes, each with its own model, instead of in this process
+        self.encode_workers = encode_workers
+        self._encode_pool = None
+        # Index parameters for new collections; Chroma fixes them at creation time,
+        # so existing collections keep whatever they were created with
+        self.hnsw_metadata = {
+            "hnsw:space": "cosine",
+            "hnsw:M": hnsw_m,
+            "hnsw:construction_ef": hnsw_construction_ef,
+            "hnsw:search_ef": hnsw_search_ef,
+            "hnsw:batch_size": hnsw_batch_size,
+            "hnsw:sync_threshold": hnsw_sync_threshold
+        }
         self.embedding_model = None
         self.client = None
         self.collections = {}
+        self._query_emb_cache = OrderedDict()
+        self._query_emb_lock = threading.Lock()
+        self._result_caches = {}  # story_id -> SemanticResultCache, replaced whenever the story changes
+        # Shared by every search_all_stories call; threads start on demand and are reused
+        self._search_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="story-search")
         self._initialize()
     
     def _initialize(self):
         """Initialize the vector store"""
         try:
             # Initialize embedding model
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-            logger.info("Embedding model loaded successfully")
+            if self.encode_workers > 0:
+                # Split the cores between workers so their thread pools don't oversubscribe
+                threads = max(1, default_num_threads() // self.encode_workers)
+                self._encode_pool = ProcessPoolExecutor(
+                    max_workers=self.encode_workers,
+                    initializer=_load_worker_model,
+                    initargs=(self.embedding_backend, self.onnx_cache_dir, threads)
+                )
+                # Load the models now instead of on the first request
+                list(self._encode_pool.map(_encode_in_worker, [["warm up"]] * self.encode_workers, repeat(1)))
+                logger.info(f"Embedding model loaded in {self.encode_workers} worker processes")
+            else:
+                self.embedding_model = load_embedding_model(self.embedding_backend, self.onnx_cache_dir)
+                logger.info("Embedding model loaded successfully")
             
             # Initialize ChromaDB client
             os.makedirs(self.persist_directory, exist_ok=True)
@@ -40,7 +287,7 @@ class VectorStoreManager:
             try:
                 collection = self.client.get_or_create_collection(
                     name=story_id,
-                    metadata={"hnsw:space": "cosine", "story_id": story_id, "created_at": datetime.now().isoformat()}
+                    metadata={**self.hnsw_metadata, "story_id": story_id, "created_at": datetime.now().isoformat()}
                 )
                 self.collections[story_id] = collection
                 logger.info(f"Collection '{story_id}' created or retrieved")
@@ -50,77 +297,193 @@ class VectorStoreManager:
         
         return self.collections[story_id]
     
-    def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts"""
+    def _get_collection(self, story_id: str):
+        """Existing collection for a name from list_collections, which returns only names"""
+        collection = self.collections.get(story_id)
+        if collection is None:
+            collection = self.collections[story_id] = self.client.get_collection(name=story_id)
+        return collection
+    
+    def _generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Generate a (len(texts), dim) float32 array of embeddings"""
+        if len(texts) == 1 and len(texts[0]) <= self.QUERY_CACHE_MAX_CHARS:
+            return self._embed_query(texts[0])[np.newaxis]
+        return self._encode(texts)
+    
+    def _embed_query(self, text: str) -> np.ndarray:
+        """Embed a single query, serving repeats from the LRU cache"""
+        with self._query_emb_lock:
+            embedding = self._query_emb_cache.get(text)
+            if embedding is not None:
+                self._query_emb_cache.move_to_end(text)
+                return embedding
+        
+        embedding = self._encode([text])[0]
+        
+        with self._query_emb_lock:
+            self._query_emb_cache[text] = embedding
+            if len(self._query_emb_cache) > self.QUERY_CACHE_SIZE:
+                self._query_emb_cache.popitem(last=False)
+        return embedding
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
         try:
-            embeddings = self.embedding_model.encode(texts, convert_to_tensor=False)
-            return embeddings.tolist()
+            # Encode in length order so each minibatch pads to similar lengths,
+            # then scatter the rows back to the caller's order
+            order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+            ordered = [texts[i] for i in order]
+            if self._encode_pool is not None:
+                # One task per minibatch, so a large ingest spreads across the workers
+                chunks = [ordered[i:i + self.batch_size] for i in range(0, len(ordered), self.batch_size)]
+                encoded = np.concatenate(list(self._encode_pool.map(_encode_in_worker, chunks, repeat(self.batch_size))))
+            else:
+                encoded = self.embedding_model.encode(ordered, batch_size=self.batch_size)
+            embeddings = np.empty_like(encoded)
+            embeddings[order] = encoded
+            return embeddings
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             raise
     
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Embed documents, padding each minibatch only to its neighbours in length order.
+        
+        Rows come back in the order of texts, so the result can be passed
+        straight to add_documents_batched.
+        """
+        # Repeated texts (refrains, re-ingested pages) are embedded once and
+        # their row copied to every position they occur at
+        unique = {}
+        inverse = np.fromiter((unique.setdefault(text, len(unique)) for text in texts), dtype=np.intp, count=len(texts))
+        if len(unique) == len(texts):
+            return self._encode(texts)
+        return self._encode(list(unique))[inverse]
+    
+    def _prepare_batch(
+        self,
+        story_id: str,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: Optional[np.ndarray],
+        created_at: str
+    ):
+        """Build ids, metadatas and (unless given) embeddings for one batch of documents"""
+        # One urandom read for the whole batch instead of a uuid4() call per document
+        raw = os.urandom(16 * len(texts))
+        ids = [raw[i:i + 16].hex() for i in range(0, len(raw), 16)]
+        
+        for text, metadata in zip(texts, metadatas):
+            metadata["text"] = text
+            metadata["story_id"] = story_id
+            metadata["created_at"] = created_at
+        
+        if embeddings is None:
+            embeddings = self._generate_embeddings(texts)
+        return ids, texts, metadatas, embeddings
+    
     def add_documents(self, story_id: str, documents: List[Dict[str, Any]]):
         """Add documents to the vector store"""
-        if not documents:
+        self.add_documents_batched(
+            story_id,
+            [doc["text"] for doc in documents],
+            [doc.get("metadata", {}) for doc in documents]
+        )
+    
+    def add_documents_batched(
+        self,
+        story_id: str,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        embeddings: Optional[np.ndarray] = None
+    ):
+        """Add parallel lists of texts and metadatas, embedding and writing batch_size documents at a time.
+        
+        Pass embeddings (one row per text) to skip embedding, e.g. when they
+        came from embed_documents.
+        """
+        if not texts:
             logger.warning("No documents to add")
             return
         
         try:
             collection = self._get_or_create_collection(story_id)
+            batch_size = batch_size or self.ADD_BATCH_SIZE
+            batches = [
+                (
+                    texts[i:i + batch_size],
+                    metadatas[i:i + batch_size],
+                    embeddings[i:i + batch_size] if embeddings is not None else None
+                )
+                for i in range(0, len(texts), batch_size)
+            ]
+            # Every document in one call shares the same timestamp
+            created_at = datetime.now().isoformat()
             
-            # Prepare data for insertion
-            ids = [str(uuid.uuid4()) for _ in documents]
-            texts = [doc["text"] for doc in documents]
-            metadatas = []
+            # Embed the next batch on a worker thread while Chroma writes the current one,
+            # so at most two batches of embeddings are alive at a time
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                pending = executor.submit(self._prepare_batch, story_id, *batches[0], created_at)
+                for next_batch in batches[1:] + [None]:
+                    ids, batch_texts, batch_metadatas, embeddings = pending.result()
+                    if next_batch is not None:
+                        pending = executor.submit(self._prepare_batch, story_id, *next_batch, created_at)
+                    
+                    collection.add(
+                        ids=ids,
+                        documents=batch_texts,
+                        embeddings=embeddings,
+                        metadatas=batch_metadatas
+                    )
             
-            for doc in documents:
-                metadata = doc.get("metadata", {})
-                metadata["text"] = doc["text"]
-                metadata["story_id"] = story_id
-                metadata["created_at"] = datetime.now().isoformat()
-                metadatas.append(metadata)
+            # Cached results no longer reflect the collection
+            self._result_caches.pop(story_id, None)
             
-            # Generate embeddings
-            embeddings = self._generate_embeddings(texts)
-            
-            # Add to collection
-            collection.add(
-                ids=ids,
-                documents=texts,
-                embeddings=embeddings,
-                metadatas=metadatas
-            )
-            
-            logger.info(f"Added {len(documents)} documents to collection '{story_id}'")
+            logger.info(f"Added {len(texts)} documents to collection '{story_id}'")
             
         except Exception as e:
             logger.error(f"Error adding documents to collection '{story_id}': {e}")
             raise
     
-    def retrieve_relevant(self, story_id: str, query: str, k: int = 5) -> Dict[str, Any]:
+    def _query_collection(self, collection, query_embedding, k: int) -> List[Dict[str, Any]]:
+        """Run a nearest-neighbour query against one collection and format the hits"""
+        results = collection.query(
+            query_embeddings=query_embedding[np.newaxis],
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        
+        formatted_results = []
+        for i in range(len(results['ids'][0])):
+            formatted_results.append({
+                "id": results['ids'][0][i],
+                "text": results['documents'][0][i],
+                "metadata": results['metadatas'][0][i],
+                "distance": results['distances'][0][i] if 'distances' in results else None
+            })
+        
+        return formatted_results
+    
+    def _query_story(self, story_id: str, query_embedding, k: int) -> List[Dict[str, Any]]:
+        return self._query_collection(self._get_collection(story_id), query_embedding, k)
+    
+    def retrieve_relevant(self, story_id: str, query: str, k: int = 5, query_embedding: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """Retrieve relevant documents for a query"""
         try:
             collection = self._get_or_create_collection(story_id)
             
-            # Generate query embedding
-            query_embedding = self._generate_embeddings([query])[0]
-            
-            # Search
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=k,
-                include=["documents", "metadatas", "distances"]
-            )
+            # Generate query embedding unless the caller already has one
+            if query_embedding is None:
+                query_embedding = self._generate_embeddings([query])[0]
             
-            # Format results
-            formatted_results = []
-            for i in range(len(results['ids'][0])):
-                formatted_results.append({
-                    "id": results['ids'][0][i],
-                    "text": results['documents'][0][i],
-                    "metadata": results['metadatas'][0][i],
-                    "distance": results['distances'][0][i] if 'distances' in results else None
-                })
+            # Near-duplicate questions reuse earlier results without touching Chroma
+            cache = self._result_caches.get(story_id)
+            if cache is None:
+                cache = self._result_caches.setdefault(story_id, SemanticResultCache())
+            formatted_results = cache.lookup(query_embedding, k)
+            if formatted_results is None:
+                formatted_results = self._query_collection(collection, query_embedding, k)
+                cache.insert(query_embedding, k, formatted_results)
             
             logger.info(f"Found {len(formatted_results)} results for query in '{story_id}'")
             
@@ -137,34 +500,49 @@ class VectorStoreManager:
     def search_all_stories(self, query: str, n_results: int = 10) -> Dict[str, Any]:
         """Search across all story collections"""
         try:
-            # Get all collections
-            all_collections = self.client.list_collections()
-            all_results = []
+            # Get all collection names
+            story_ids = self.client.list_collections()
+            
+            # Bounded max-heap of (-distance, -order, result): only the n_results
+            # closest hits are retained, and ties keep the earlier collection/rank
+            heap = []
             
-            for collection_info in all_collections:
-                story_id = collection_info.name
+            # Encode the query once and reuse it for every collection
+            query_embedding = self._generate_embeddings([query])[0]
+            
+            # Chroma's HNSW search runs in native code without the GIL, so the
+            # per-collection lookups and queries overlap and latency tracks the slowest one
+            futures = {
+                self._search_executor.submit(self._query_story, story_id, query_embedding, n_results): (index, story_id)
+                for index, story_id in enumerate(story_ids)
+            }
+            for future in as_completed(futures):
+                index, story_id = futures[future]
                 try:
-                    story_results = self.retrieve_relevant(story_id, query, n_results)
-                    for result in story_results["results"]:
-                        result["story_id"] = story_id
-                        all_results.append(result)
+                    results = future.result()
                 except Exception as e:
                     logger.warning(f"Error searching in collection '{story_id}': {e}")
                     continue
+                
+                for rank, result in enumerate(results):
+                    result["story_id"] = story_id
+                    distance = result.get("distance")
+                    order = index * n_results + rank
+                    item = (-(distance if distance is not None else float("inf")), -order, result)
+                    if len(heap) < n_results:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
             
-            # Sort by distance if available
-            if all_results and all_results[0].get("distance") is not None:
-                all_results.sort(key=lambda x: x["distance"])
-            
-            # Limit results
-            all_results = all_results[:n_results]
+            # Closest first
+            all_results = [result for _, _, result in sorted(heap, reverse=True)]
             
             logger.info(f"Found {len(all_results)} total results across all stories")
             
             return {
                 "query": query,
                 "results": all_results,
-                "total_collections": len(all_collections)
+                "total_collections": len(story_ids)
             }
             
         except Exception as e:
@@ -199,13 +577,17 @@ class VectorStoreManager:
     def list_stories(self) -> List[Dict[str, Any]]:
         """List all available story collections"""
         try:
-            collections = self.client.list_collections()
             stories = []
             
-            for collection in collections:
-                story_id = collection.name
-                info = self.get_story_info(story_id)
-                stories.append(info)
+            # list_collections returns names; collections already opened by this
+            # process are reused instead of fetched again
+            for story_id in self.client.list_collections():
+                collection = self._get_collection(story_id)
+                stories.append({
+                    "story_id": story_id,
+                    "document_count": collection.count(),
+                    "metadata": collection.metadata or {}
+                })
             
             logger.info(f"Found {len(stories)} story collections")
             return stories
@@ -220,10 +602,28 @@ class VectorStoreManager:
             self.client.delete_collection(name=story_id)
             if story_id in self.collections:
                 del self.collections[story_id]
+            self._result_caches.pop(story_id, None)
             
             logger.info(f"Deleted collection '{story_id}'")
             return True
             
         except Exception as e:
             logger.error(f"Error deleting collection '{story_id}': {e}")
-            return False
\ No newline at end of file
+            return False
+
+@lru_cache(maxsize=1)
+def get_vector_store():
+    """Shared vector store, so the embedding model is loaded once per process"""
+    if VECTOR_STORE_BACKEND == "sqlite-vec":
+        if ENCODE_WORKERS:
+            raise ValueError("ENCODE_WORKERS is only supported by the chroma backend")
+        try:
+            from sqlite_vec_store import SqliteVecStore
+        except ImportError:  # imported as backend.vector_store, e.g. from scripts/ingest.py
+            from .sqlite_vec_store import SqliteVecStore
+        return SqliteVecStore(SQLITE_VEC_PATH, quantization=VECTOR_QUANTIZATION)
+    if VECTOR_STORE_BACKEND != "chroma":
+        raise ValueError(f"Unsupported VECTOR_STORE_BACKEND: {VECTOR_STORE_BACKEND}")
+    if VECTOR_QUANTIZATION != "float32":
+        raise ValueError("VECTOR_QUANTIZATION is only supported by the sqlite-vec backend")
+    return VectorStoreManager(encode_workers=ENCODE_WORKERS)
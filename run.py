@@ -2,15 +2,16 @@ import logging
 import subprocess
 import sys
 import json
+import re
 import uuid
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 from pydantic import BaseModel, Field
-from fastapi import FastAPI, Request, HTTPException, status, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, status, UploadFile, File, Form
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from PyPDF2 import PdfReader
+from pypdf import PdfReader
 import io
 import uvicorn
 from pathlib import Path
@@ -36,21 +37,23 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Storybook Adventure Chat API",
     description="Backend API for the Storybook Adventure Chat application",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Serve static files
-app.mount("/static", StaticFiles(directory="frontend"), name="static")
-
-# Add middleware to disable caching for static files
-@app.middleware("http")
-async def add_no_cache_headers(request: Request, call_next):
-    response = await call_next(request)
-    if request.url.path.startswith("/static/"):
+class NoCacheStaticFiles(StaticFiles):
+    """StaticFiles that disables caching on the files it serves"""
+    
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
         response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
         response.headers["Pragma"] = "no-cache"
         response.headers["Expires"] = "0"
-    return response
+        return response
+
+# Serve static files; the no-cache headers are added by the mount itself so
+# API requests don't pass through an extra middleware
+app.mount("/static", NoCacheStaticFiles(directory="frontend"), name="static")
 
 # Add CORS middleware
 app.add_middleware(
@@ -146,41 +149,6 @@ stories_db[sample_story.id] = sample_story
 
 frontend_process = None
 
-# Serve static files from frontend directory
-static_dir = Path("frontend")
-if not static_dir.exists():
-    static_dir.mkdir()
-    (static_dir / "index.html").write_text("""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Full Stack App</title>
-        <style>
-            body { font-family: Arial, sans-serif; padding: 20px; }
-            .status { margin: 20px 0; padding: 10px; background: #f0f0f0; }
-        </style>
-    </head>
-    <body>
-        <h1>Welcome to Full Stack App</h1>
-        <div class="status" id="status">Backend is running!</div>
-        <p>Check the console for detailed logs.</p>
-        <script>
-            // Simple frontend JavaScript
-            document.addEventListener('DOMContentLoaded', () => {
-                console.log('Frontend loaded');
-                fetch('/api/health')
-                    .then(response => response.json())
-                    .then(data => {
-                        console.log('Health check:', data);
-                        document.getElementById('status').textContent = 
-                            `Backend status: ${data.status}`;
-                    });
-            });
-        </script>
-    </body>
-    </html>
-    """)
-
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
     return FileResponse('frontend/index.html')
@@ -216,22 +184,25 @@ async def create_story(story: StoryCreate):
 @app.get("/api/stories/{story_id}", response_model=Story)
 async def get_story(story_id: str):
     """Get a specific story by ID."""
-    if story_id not in stories_db:
+    story = stories_db.get(story_id)
+    if story is None:
         raise HTTPException(status_code=404, detail="Story not found")
-    return stories_db[story_id]
+    return story
 
 # Message endpoints
 @app.get("/api/stories/{story_id}/messages", response_model=List[Message])
 async def get_messages(story_id: str):
     """Get all messages for a story."""
-    if story_id not in stories_db:
+    story = stories_db.get(story_id)
+    if story is None:
         raise HTTPException(status_code=404, detail="Story not found")
-    return stories_db[story_id].messages
+    return story.messages
 
 @app.post("/api/stories/{story_id}/messages", response_model=Message, status_code=status.HTTP_201_CREATED)
 async def create_message(story_id: str, message: MessageCreate):
     """Add a new message to a story."""
-    if story_id not in stories_db:
+    story = stories_db.get(story_id)
+    if story is None:
         raise HTTPException(status_code=404, detail="Story not found")
     
     new_message = Message(
@@ -240,35 +211,56 @@ async def create_message(story_id: str, message: MessageCreate):
         story_id=story_id
     )
     
-    stories_db[story_id].messages.append(new_message)
-    stories_db[story_id].updated_at = datetime.utcnow().isoformat()
+    story.messages.append(new_message)
+    story.updated_at = datetime.utcnow().isoformat()
     
     # Generate a more intelligent bot response
     if message.sender == "user":
-        bot_response_content = generate_bot_response(message.content, stories_db[story_id])
+        bot_response_content = generate_bot_response(message.content, story)
         bot_response = Message(
             content=bot_response_content,
             sender="bot",
             story_id=story_id
         )
-        stories_db[story_id].messages.append(bot_response)
+        story.messages.append(bot_response)
     
     return new_message
 
+# Keyword groups for generate_bot_response, each compiled into a single
+# alternation so a check is one scan of the message. Word boundaries keep
+# short keywords like "hi" from matching inside "this"; topic stems
+# ("seed", "grow") stay open-ended to cover plurals and inflections.
+RESPONSE_KEYWORDS = {
+    "greeting": re.compile(r"\b(?:hi|hello|hey|greetings)\b"),
+    "info": re.compile(r"\b(?:what|tell me|about|summary)\b"),
+    "character": re.compile(r"\b(?:characters?|who)\b"),
+    "location": re.compile(r"\b(?:where|locations?|places?)\b"),
+    "expansion": re.compile(r"\b(?:expand|continue|what happens next|add)\b"),
+    "help": re.compile(r"\b(?:help|how|can i)\b"),
+    "seed": re.compile(r"\bseed"),
+    "garden": re.compile(r"\bgarden"),
+    "growth": re.compile(r"\bgrow"),
+    "positive": re.compile(r"\b(?:interesting|cool|nice|good)\b"),
+    "agreement": re.compile(r"\b(?:yes|yeah|sure|ok)\b"),
+}
+
+def _matches(group: str, text: str) -> bool:
+    return RESPONSE_KEYWORDS[group].search(text) is not None
+
 def generate_bot_response(user_message: str, story: Story) -> str:
     """Generate an intelligent bot response based on the user message and story context."""
     user_message_lower = user_message.lower()
     
     # Greeting responses
-    if any(greeting in user_message_lower for greeting in ["hi", "hello", "hey", "greetings"]):
+    if _matches("greeting", user_message_lower):
         return f"Hello! I'm here to help you explore '{story.title}'. What would you like to know about this story?"
     
     # Story information requests
-    if any(word in user_message_lower for word in ["what", "tell me", "about", "summary"]):
+    if _matches("info", user_message_lower):
         return f"'{story.title}' is about: {story.content[:200]}... Would you like me to elaborate on any part of the story?"
     
     # Character questions
-    if "character" in user_message_lower or "who" in user_message_lower:
+    if _matches("character", user_message_lower):
         characters = [elem for elem in story.elements if elem.type == "character"]
         if characters:
             char_names = ", ".join([c.name for c in characters])
@@ -277,7 +269,7 @@ def generate_bot_response(user_message: str, story: Story) -> str:
             return "This story doesn't have any defined characters yet. Would you like to add some?"
     
     # Location questions
-    if "where" in user_message_lower or "location" in user_message_lower or "place" in user_message_lower:
+    if _matches("location", user_message_lower):
         locations = [elem for elem in story.elements if elem.type == "location"]
         if locations:
             loc_names = ", ".join([l.name for l in locations])
@@ -286,11 +278,11 @@ def generate_bot_response(user_message: str, story: Story) -> str:
             return "The story's setting isn't fully described yet. Where would you like the story to take place?"
     
     # Expansion requests
-    if any(word in user_message_lower for word in ["expand", "continue", "what happens next", "add"]):
+    if _matches("expansion", user_message_lower):
         return f"That's a great idea! To expand '{story.title}', you could add new characters, events, or explore what happens next. What specific expansion would you like to propose?"
     
     # Help requests
-    if any(word in user_message_lower for word in ["help", "how", "can I"]):
+    if _matches("help", user_message_lower):
         return """I can help you with this story in several ways:
 • Ask questions about the plot or characters
 • Suggest story expansions or new elements
@@ -300,20 +292,20 @@ def generate_bot_response(user_message: str, story: Story) -> str:
 What would you like to do?"""
     
     # More specific contextual responses
-    if "seed" in user_message_lower or "little seed" in user_message_lower:
+    if _matches("seed", user_message_lower):
         return "The Little Seed is the main character of our story! It's a small seed with big dreams, waiting to grow into something wonderful. What would you like to know about the seed's journey?"
     
-    if "garden" in user_message_lower:
+    if _matches("garden", user_message_lower):
         return "The garden is where our story takes place! It's a beautiful setting full of life and possibilities. Would you like to explore what happens in the garden?"
     
-    if "grow" in user_message_lower or "growth" in user_message_lower:
+    if _matches("growth", user_message_lower):
         return "Growth is a central theme in this story! The little seed's journey represents patience, hope, and transformation. What aspect of growth interests you most?"
     
     # Conversational responses
-    if any(word in user_message_lower for word in ["interesting", "cool", "nice", "good"]):
+    if _matches("positive", user_message_lower):
         return "I'm glad you find it interesting! There's so much more to explore in this story. What would you like to discover next?"
     
-    if any(word in user_message_lower for word in ["yes", "yeah", "sure", "ok"]):
+    if _matches("agreement", user_message_lower):
         return "Great! Let's continue exploring. What aspect of the story would you like to focus on - the characters, the setting, or perhaps what happens next?"
     
     # Default intelligent response (more varied and contextual)
@@ -331,7 +323,8 @@ What would you like to do?"""
 @app.post("/api/stories/{story_id}/elements", response_model=StoryElement, status_code=status.HTTP_201_CREATED)
 async def create_story_element(story_id: str, element: StoryElementCreate):
     """Add a new element to a story."""
-    if story_id not in stories_db:
+    story = stories_db.get(story_id)
+    if story is None:
         raise HTTPException(status_code=404, detail="Story not found")
     
     new_element = StoryElement(
@@ -341,11 +334,19 @@ async def create_story_element(story_id: str, element: StoryElementCreate):
         story_id=story_id
     )
     
-    stories_db[story_id].elements.append(new_element)
-    stories_db[story_id].updated_at = datetime.utcnow().isoformat()
+    story.elements.append(new_element)
+    story.updated_at = datetime.utcnow().isoformat()
     
     return new_element
 
+def extract_pdf_text(contents: bytes) -> str:
+    """Extract the text of every page in a PDF."""
+    # Create a PDF reader object
+    pdf_reader = PdfReader(io.BytesIO(contents))
+    
+    # Extract text from all pages; pages without a text layer yield None
+    return "\n\n".join(page.extract_text() or "" for page in pdf_reader.pages)
+
 # PDF Upload endpoint
 @app.post("/api/upload-pdf/", response_model=PDFUploadResponse)
 async def upload_pdf(file: UploadFile = File(...)):
@@ -354,13 +355,8 @@ async def upload_pdf(file: UploadFile = File(...)):
         # Read the uploaded file
         contents = await file.read()
         
-        # Create a PDF reader object
-        pdf_reader = PdfReader(io.BytesIO(contents))
-        
-        # Extract text from all pages
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n\n"
+        # Parse off the event loop so large PDFs don't stall other requests
+        text = await asyncio.to_thread(extract_pdf_text, contents)
         
         # Create a new story from the PDF content
         story_id = str(len(stories_db) + 1)
@@ -1,16 +1,68 @@
-import json
+import asyncio
+import mmap
 import os
+import string
+import sys
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from itertools import islice
 from pathlib import Path
-from backend.vector_store import VectorStoreManager
+import fastjsonschema
+import ijson
+import numpy as np
+import orjson
+from backend.vector_store import get_vector_store
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Pages parsed, embedded and stored per window when ingesting a book file
+INGEST_WINDOW_PAGES = 1024
+# Smaller book files are parsed whole with orjson; larger ones are streamed
+STREAM_PARSE_MIN_BYTES = 64 * 1024 * 1024
+# Windows embedded concurrently. Each encode already uses default_num_threads()
+# cores, so raise this only together with fewer encoder threads (WEB_CONCURRENCY)
+INGESTION_PARALLEL_THREADS = int(os.getenv("INGESTION_PARALLEL_THREADS", "1"))
+# Books at least this large fill page numbers with the numba kernel. Importing
+# numba and loading the cached kernel takes ~0.6s, while the numpy fill costs only
+# ~9us more per window, so the JIT pays off only past tens of millions of pages
+JIT_FILL_MIN_BYTES = 16 * 1024 ** 3
+# Seconds ingestion waits on one window's embedding or storage before giving up
+# on it; the busy thread is abandoned rather than interrupted
+INGESTION_CHUNK_TIMEOUT = float(os.getenv("INGESTION_CHUNK_TIMEOUT", "600"))
+
+PAGE_SCHEMA = {
+    "type": "object",
+    "required": ["text"],
+    "properties": {
+        "text": {"type": "string"},
+        # Same lower bound as models.PageNumber; the upper bound keeps it in int64
+        "page_number": {"type": "integer", "minimum": 1, "maximum": np.iinfo(np.int64).max}
+    }
+}
+BOOK_SCHEMA = {
+    "type": "object",
+    "required": ["title", "pages"],
+    "properties": {
+        "title": {"type": "string"},
+        "story_id": {"type": "string"},
+        "pages": {"type": "array", "minItems": 1, "items": PAGE_SCHEMA}
+    }
+}
+
+# Compiled once at import; streamed books check the header and then each page.
+# ijson is asked for floats rather than Decimals so numbers validate as they do
+# from orjson (e.g. a page_number of 1.0), whatever the file size
+_BOOK_VALIDATOR = fastjsonschema.compile(BOOK_SCHEMA)
+_HEADER_VALIDATOR = fastjsonschema.compile({**BOOK_SCHEMA, "required": ["title"]})
+_PAGE_VALIDATOR = fastjsonschema.compile(PAGE_SCHEMA)
+
 def ingest_sample_book():
     """Ingest a sample children's book"""
     try:
-        vector_store = VectorStoreManager()
+        vector_store = get_vector_store()
         
         # Sample book data
         sample_book = {
@@ -33,91 +85,222 @@ def ingest_sample_book():
             ]
         }
         
-        # Prepare documents for vector store
-        documents = []
-        for page in sample_book["pages"]:
-            documents.append({
-                "text": page["text"],
-                "metadata": {
-                    "page_number": page["page_number"],
-                    "title": sample_book["title"],
-                    "story_id": sample_book["story_id"]
-                }
-            })
+        # Prepare page texts and metadata for vector store
+        title = sample_book["title"]
+        story_id = sample_book["story_id"]
+        texts, metadatas = _prepare_window(sample_book["pages"], 0, title, story_id)
         
-        # Add to vector store
-        vector_store.add_documents(sample_book["story_id"], documents)
+        # Add to vector store in one call
+        vector_store.add_documents_batched(story_id, texts, metadatas)
         
-        logger.info(f"Ingested {len(documents)} pages from '{sample_book['title']}'")
-        print(f"Ingested {len(documents)} pages from '{sample_book['title']}'")
+        logger.info("Ingested %d pages from '%s'", len(texts), title)
         
-    except Exception as e:
-        logger.error(f"Error ingesting sample book: {e}")
+    except Exception:
+        logger.exception("Error ingesting sample book")
         raise
 
-def ingest_from_json(file_path):
-    """Ingest book from JSON file"""
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-    
-    if not file_path.lower().endswith('.json'):
-        raise ValueError(f"File must be a JSON file: {file_path}")
+# Lowercases ASCII letters and replaces spaces in one pass
+_SLUG_TABLE = str.maketrans({" ": "_", **{c: c.lower() for c in string.ascii_uppercase}})
+
+def _slugify(title):
+    """Default story_id for a title: lowercased, with spaces as underscores"""
+    if title.isascii():
+        return title.translate(_SLUG_TABLE)
+    return title.lower().translate(_SLUG_TABLE)
+
+# Placeholder for pages without a page_number, filled in by _prepare_window;
+# PAGE_SCHEMA only admits page numbers from 1
+_MISSING_PAGE_NUMBER = 0
+
+def _fill_page_numbers_loop(page_numbers, first_number):
+    """Number pages without a page_number by their 1-based position in the book"""
+    for i in range(page_numbers.shape[0]):
+        if page_numbers[i] == _MISSING_PAGE_NUMBER:
+            page_numbers[i] = first_number + i
+
+def _fill_page_numbers_numpy(page_numbers, first_number):
+    """Number pages without a page_number by their 1-based position in the book"""
+    missing = page_numbers == _MISSING_PAGE_NUMBER
+    page_numbers[missing] = first_number + np.flatnonzero(missing)
+
+@lru_cache(maxsize=1)
+def _fill_page_numbers_kernel():
+    """The numba-compiled loop, or the numpy expression without numba.
     
+    numba is imported on first use rather than with this module, so only
+    books of JIT_FILL_MIN_BYTES or more pay for it.
+    """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            book_data = json.load(f)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Invalid JSON in file {file_path}: {e}")
-    except UnicodeDecodeError as e:
-        raise ValueError(f"Encoding error in file {file_path}: {e}")
+        from numba import njit
+    except ImportError:  # numba is optional
+        return _fill_page_numbers_numpy
+    return njit(cache=True)(_fill_page_numbers_loop)
+
+# Top-level fields read by _read_book_header
+_HEADER_FIELDS = ("title", "story_id")
+_SCALAR_EVENTS = ("string", "number", "boolean")
+
+def _read_book_header(f):
+    """Read the book's top-level title and story_id without parsing its pages into memory.
     
-    # Validate book data structure
-    if not isinstance(book_data, dict):
-        raise ValueError("Book data must be a dictionary")
+    The single pass stops at the "pages" key once the title has been seen,
+    so a story_id placed after the pages is only picked up when the title
+    is placed there too.
+    """
+    book_data = {}
+    for prefix, event, value in ijson.parse(f, use_float=True):
+        if prefix == "" and event == "map_key" and value == "pages" and "title" in book_data:
+            break
+        if prefix in _HEADER_FIELDS and event in _SCALAR_EVENTS:
+            book_data[prefix] = value
+            if len(book_data) == len(_HEADER_FIELDS):
+                break
+    f.seek(0)
+    return book_data
+
+def _parse_book(f, file_size):
+    """Return the book's validated top-level fields and an iterator over its validated pages"""
+    if file_size == 0:
+        raise ValueError("Book file is empty")
     
-    if "title" not in book_data:
-        raise ValueError("Book data must contain a 'title' field")
+    if file_size < STREAM_PARSE_MIN_BYTES:
+        # Parse straight from the page cache rather than reading a copy of the file first
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            book_data = _BOOK_VALIDATOR(orjson.loads(view))
+        return book_data, iter(book_data["pages"])
     
-    if "pages" not in book_data or not isinstance(book_data["pages"], list):
-        raise ValueError("Book data must contain a 'pages' list")
+    book_data = _HEADER_VALIDATOR(_read_book_header(f))
+    # Validate every page in a separate pass before anything is written, so
+    # an invalid page fails the ingest with the store untouched
+    for page in ijson.items(f, "pages.item", use_float=True):
+        _PAGE_VALIDATOR(page)
+    f.seek(0)
+    return book_data, ijson.items(f, "pages.item", use_float=True)
+
+def _read_window(pages):
+    return list(islice(pages, INGEST_WINDOW_PAGES))
+
+def _prepare_window(window, first_index, title, story_id, fill_page_numbers=_fill_page_numbers_numpy):
+    """Return the texts and metadatas for a window of validated pages"""
+    # Column per field rather than a metadata dict per page; the dicts
+    # Chroma needs are only built once the columns are filled
+    texts = [page["text"] for page in window]
+    page_numbers = np.fromiter(
+        (page.get("page_number", _MISSING_PAGE_NUMBER) for page in window),
+        dtype=np.int64,
+        count=len(window)
+    )
+    fill_page_numbers(page_numbers, first_index + 1)
     
-    if len(book_data["pages"]) == 0:
-        raise ValueError("Book must have at least one page")
+    metadatas = [
+        {
+            "page_number": page_number,
+            "title": title,
+            "story_id": story_id
+        }
+        for page_number in page_numbers.tolist()
+    ]
+    return texts, metadatas
+
+async def ingest_from_json_async(file_path, batch_size=64, parallel=INGESTION_PARALLEL_THREADS):
+    """Ingest book from JSON file, overlapping parsing, embedding and storage.
+    
+    Pages are ingested INGEST_WINDOW_PAGES at a time. While one window is
+    written to the vector store, up to `parallel` later windows are embedded
+    on worker threads and the next is parsed. Files of STREAM_PARSE_MIN_BYTES
+    or more are stream-parsed, so memory use is bounded by the windows in
+    flight rather than the size of the book.
+    
+    A window that takes longer than INGESTION_CHUNK_TIMEOUT to embed or store
+    raises asyncio.TimeoutError; windows not yet started are cancelled.
+    
+    Every page is validated before the first window is written, so invalid
+    book data never leaves a partial story behind. An embedding or storage
+    failure part-way through can still leave earlier windows stored.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    
+    if not file_path.lower().endswith('.json'):
+        raise ValueError(f"File must be a JSON file: {file_path}")
+    
+    loop = asyncio.get_running_loop()
+    # One thread each for parsing and storing, the rest embed
+    executor = ThreadPoolExecutor(max_workers=parallel + 2)
+    embedding = deque()  # (texts, metadatas, embedding future) in page order
+    storing = None
     
     try:
-        vector_store = VectorStoreManager()
-        
-        documents = []
-        for i, page in enumerate(book_data["pages"]):
-            if not isinstance(page, dict):
-                logger.warning(f"Skipping invalid page {i}: not a dictionary")
-                continue
+        with open(file_path, 'rb') as f:
+            file_size = os.path.getsize(file_path)
+            book_data, pages = await loop.run_in_executor(executor, _parse_book, f, file_size)
+            fill_page_numbers = _fill_page_numbers_numpy
+            if file_size >= JIT_FILL_MIN_BYTES:
+                fill_page_numbers = await loop.run_in_executor(executor, _fill_page_numbers_kernel)
             
-            if "text" not in page:
-                logger.warning(f"Skipping page {i}: missing 'text' field")
-                continue
+            vector_store = await loop.run_in_executor(executor, get_vector_store)
+            # Every page's metadata shares these two strings
+            title = sys.intern(book_data["title"])
+            story_id = sys.intern(book_data.get("story_id") or _slugify(title))
             
-            documents.append({
-                "text": page["text"],
-                "metadata": {
-                    "page_number": page.get("page_number", i + 1),
-                    "title": book_data["title"],
-                    "story_id": book_data.get("story_id", book_data["title"].lower().replace(" ", "_"))
-                }
-            })
-        
-        if not documents:
-            raise ValueError("No valid pages found in the book data")
-        
-        story_id = book_data.get("story_id", book_data["title"].lower().replace(" ", "_"))
-        vector_store.add_documents(story_id, documents)
+            page_count = 0
+            
+            async def store_oldest():
+                # Windows are written one at a time and in page order
+                nonlocal storing
+                texts, metadatas, embeddings = embedding.popleft()
+                embeddings = await asyncio.wait_for(embeddings, INGESTION_CHUNK_TIMEOUT)
+                if storing is not None:
+                    await asyncio.wait_for(storing, INGESTION_CHUNK_TIMEOUT)
+                storing = loop.run_in_executor(
+                    executor,
+                    partial(vector_store.add_documents_batched, story_id, texts, metadatas, batch_size=batch_size, embeddings=embeddings)
+                )
+            
+            while True:
+                window = await loop.run_in_executor(executor, _read_window, pages)
+                if not window:
+                    break
+                
+                texts, metadatas = _prepare_window(window, page_count, title, story_id, fill_page_numbers)
+                page_count += len(window)
+                
+                # Embed the window at once so minibatches group pages of similar
+                # length; rows come back in page order
+                embedding.append((texts, metadatas, loop.run_in_executor(executor, vector_store.embed_documents, texts)))
+                if len(embedding) >= parallel:
+                    await store_oldest()
+            
+            while embedding:
+                await store_oldest()
+            if storing is not None:
+                await asyncio.wait_for(storing, INGESTION_CHUNK_TIMEOUT)
+            
+            if page_count == 0:
+                raise ValueError("Book data must contain a non-empty 'pages' list")
         
-        logger.info(f"Ingested {len(documents)} pages from '{book_data['title']}'")
-        print(f"Ingested {len(documents)} pages from '{book_data['title']}'")
+        logger.info("Ingested %d pages from '%s'", page_count, title)
         
-    except Exception as e:
-        logger.error(f"Error processing book data: {e}")
+    except (orjson.JSONDecodeError, ijson.JSONError) as e:
+        raise ValueError(f"Invalid JSON in file {file_path}: {e}")
+    except fastjsonschema.JsonSchemaException as e:
+        raise ValueError(f"Invalid book data in file {file_path}: {e}")
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Encoding error in file {file_path}: {e}")
+    except Exception:
+        logger.exception("Error processing book data")
         raise
+    finally:
+        # On success nothing is left; on an error or timeout, drop queued
+        # windows and return without joining a thread still busy with one
+        for future in [storing, *(pending for _, _, pending in embedding)]:
+            if future is not None:
+                future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def ingest_from_json(file_path, batch_size=64, parallel=INGESTION_PARALLEL_THREADS):
+    """Ingest book from JSON file"""
+    asyncio.run(ingest_from_json_async(file_path, batch_size=batch_size, parallel=parallel))
 
 if __name__ == "__main__":
     # Create sample book directory if it doesn't exist
@@ -145,8 +328,8 @@ if __name__ == "__main__":
     }
     
     # Save sample book
-    with open("data/books/sample_book.json", "w") as f:
-        json.dump(sample_book, f, indent=2)
+    with open("data/books/sample_book.json", "wb") as f:
+        f.write(orjson.dumps(sample_book, option=orjson.OPT_INDENT_2))
     
     # Ingest the sample book
     ingest_from_json("data/books/sample_book.json")
\ No newline at end of file